@@ -0,0 +1,73 @@
+import argparse
+import random
+import time
+
+from routes.intepreter import Environment, compile_program, eval_function, parse_program, run_compiled
+
+
+# Generate a program of `size` lines mixing variable definitions, nested
+# arithmetic and string calls, with every variable read after it is set
+def generate_program(size, seed=0):
+    rng = random.Random(seed)
+    expressions = []
+    defined = []
+    for i in range(size):
+        operand = rng.choice(defined) if defined else str(rng.randint(1, 100))
+        kind = i % 4
+        if kind == 0:
+            name = "v{}".format(i)
+            expressions.append("(set {} (add {} {}))".format(name, operand, rng.randint(1, 100)))
+            defined.append(name)
+        elif kind == 1:
+            expressions.append("(multiply (subtract {} 3) (divide {} 7))".format(operand, rng.randint(1, 100)))
+        elif kind == 2:
+            expressions.append('(concat (uppercase "word {}") (str {}))'.format(i, operand))
+        else:
+            expressions.append("(max {} (abs -{}) (min 4 {}))".format(operand, rng.randint(1, 100), operand))
+    return expressions
+
+
+def run_tree(program):
+    env = Environment()
+    output = []
+    for i, node in enumerate(program):
+        result, error = eval_function(node, i + 1, env)
+        if result is not None:
+            output.append(str(result))
+        if error is not None:
+            output.append(error)
+            break
+    return output
+
+
+def best_of(repeat, func, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the /lisp-parser tree-walking evaluator with the bytecode VM")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("{:>8} {:>10} {:>10} {:>10} {:>8}".format("lines", "parse", "tree", "vm", "speedup"))
+    for size in args.sizes:
+        expressions = generate_program(size)
+        parse_time, program = best_of(1, parse_program, expressions)
+        compiled = compile_program(program)
+
+        tree_time, tree_output = best_of(args.repeat, run_tree, program)
+        vm_time, vm_output = best_of(args.repeat, run_compiled, compiled)
+        assert tree_output == vm_output, "VM output differs from the tree-walking evaluator"
+
+        print("{:>8} {:>9.1f}ms {:>9.1f}ms {:>9.1f}ms {:>7.2f}x".format(
+            size, parse_time * 1000, tree_time * 1000, vm_time * 1000, tree_time / vm_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from flask import Flask
 
 app = Flask(__name__)
+import routes.cache
 import routes.square
 import routes.tourist
 import routes.dc
@@ -1,5 +1,5 @@
 from flask import Flask, request, jsonify
-from collections import defaultdict, deque
+from array import array
 import logging
 
 from routes import app
@@ -7,35 +7,61 @@ from routes import app
 logger = logging.getLogger(__name__)
 
 
+# Compressed sparse row graph built straight from the 1-based prerequisite
+# pairs: the successors of x are targets[offsets[x]:offsets[x + 1]]
+def build_csr(n, prerequisites):
+    offsets = array('i', bytes(4 * (n + 1)))
+    indegree = array('i', bytes(4 * n))
+    for a, b in prerequisites:
+        offsets[a] += 1
+        indegree[b - 1] += 1
+    for x in range(n):
+        offsets[x + 1] += offsets[x]
+
+    targets = array('i', bytes(4 * len(prerequisites)))
+    fill = offsets[:-1]
+    for a, b in prerequisites:
+        targets[fill[a - 1]] = b - 1
+        fill[a - 1] += 1
+    return offsets, targets, indegree
+
+
+# Longest (critical) path through the prerequisite DAG, processed in
+# topological order with Kahn's algorithm. finish[x] is the earliest time
+# project x can be done. Returns None if the prerequisites contain a cycle.
+def critical_path_time(time, offsets, targets, indegree):
+    n = len(time)
+    indegree = array('i', indegree)
+    finish = list(time)
+    order = array('i', (x for x in range(n) if indegree[x] == 0))
+
+    head = 0
+    while head < len(order):
+        x = order[head]
+        head += 1
+        done = finish[x]
+        for y in targets[offsets[x]:offsets[x + 1]]:
+            if done + time[y] > finish[y]:
+                finish[y] = done + time[y]
+            indegree[y] -= 1
+            if indegree[y] == 0:
+                order.append(y)
+
+    if len(order) != n:
+        return None
+    return max(finish, default=0)
+
+
 @app.route('/bugfixer/p1', methods=['POST'])
 def bug_fixer():
     data = request.get_json()
     results = []
-    for entry in data:
-        time = entry["time"]
-        prerequisites = entry["prerequisites"]
-
-        n = len(time)
-        
-        # Create a graph and indegree count
-        graph = defaultdict(list)
-        indegree = [0] * n
-        
-        for a, b in prerequisites:
-            # Adjust for 0-based indexing
-            graph[a - 1].append(b - 1)
-            indegree[b - 1] += 1
-
-        def dfs(x):
-            res = 0
-            for n in graph[x]:
-                res = max(res, dfs(n))
-            return time[x] + res
-        
-        res = 0
-        for i in range(n):
-            if indegree[i] == 0:
-                res = max(res, dfs(i))
+    for i, entry in enumerate(data):
+        offsets, targets, indegree = build_csr(len(entry["time"]), entry["prerequisites"])
+        res = critical_path_time(entry["time"], offsets, targets, indegree)
+        if res is None:
+            logger.warning("Cycle detected in prerequisites of entry %d", i)
+            return jsonify({"error": f"Cycle detected in prerequisites of entry {i}"}), 400
         results.append(res)
     return jsonify(results)
 
@@ -1,39 +1,79 @@
 from flask import request, jsonify
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import heapq
+import os
+import threading
 
 import logging
 
 from routes import app
 logger = logging.getLogger(__name__)
 
+# Process pool for ?parallel=true requests, created on first use so every
+# gunicorn worker only starts one if it actually gets parallel traffic
+WORKERS = os.cpu_count() or 1
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=WORKERS)
+        return _executor
+
+
+# Drop a pool that lost a child process so the next request starts a fresh one
+def discard_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def max_bugs_fixed(bug_seq):
+    # Sort bugs by their limit
+    bug_seq = sorted(bug_seq, key=lambda x: x[1])  # Sort by limit
+
+    total_time = 0
+    min_heap = []  # Min-heap to keep track of the difficulties of fixed bugs
+    count_bugs = 0
+
+    for difficulty, limit in bug_seq:
+        total_time += difficulty
+        heapq.heappush(min_heap, -difficulty)
+        count_bugs += 1
+
+        # If total_time exceeds the limit, remove the most difficult bug
+        if total_time > limit:
+            # Remove the most difficult bug (max in min-heap)
+            hardest_bug = -heapq.heappop(min_heap)
+            total_time -= hardest_bug
+            count_bugs -= 1  # Decrease the count as we can't fix this bug
+
+    return count_bugs
+
 
 @app.route('/bugfixer/p2', methods=['POST'])
 def max_bugsfixed():
     data = request.get_json()
-    results = []
-    
-    for entry in data:
-        bug_seq = entry["bugseq"]
-        
-        # Sort bugs by their limit
-        bug_seq.sort(key=lambda x: x[1])  # Sort by limit
-        
-        total_time = 0
-        min_heap = []  # Min-heap to keep track of the difficulties of fixed bugs
-        count_bugs = 0
-        
-        for difficulty, limit in bug_seq:
-            total_time += difficulty
-            heapq.heappush(min_heap, -difficulty)
-            count_bugs += 1
-            
-            # If total_time exceeds the limit, remove the most difficult bug
-            if total_time > limit:
-                # Remove the most difficult bug (max in min-heap)
-                hardest_bug = -heapq.heappop(min_heap)
-                total_time -= hardest_bug
-                count_bugs -= 1  # Decrease the count as we can't fix this bug
-
-        results.append(count_bugs)
+    bug_seqs = [entry["bugseq"] for entry in data]
+
+    if request.args.get("parallel", "").lower() in ("1", "true") and len(bug_seqs) > 1:
+        # A few chunks per worker keeps pickling overhead low while still
+        # balancing uneven sequence sizes; map() preserves input order
+        chunksize = max(1, len(bug_seqs) // (WORKERS * 4))
+        executor = get_executor()
+        try:
+            results = list(executor.map(max_bugs_fixed, bug_seqs, chunksize=chunksize))
+        except BrokenProcessPool:
+            logger.warning("Bug fixer process pool broke, solving this request in-thread")
+            discard_executor(executor)
+            results = [max_bugs_fixed(bug_seq) for bug_seq in bug_seqs]
+    else:
+        results = [max_bugs_fixed(bug_seq) for bug_seq in bug_seqs]
 
     return jsonify(results)
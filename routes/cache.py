@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify
+
+from routes import app
+
+logger = logging.getLogger(__name__)
+
+# Every cache registers itself here so /cache-stats can report on it
+CACHES = {}
+
+
+# Canonical hash of a JSON-serializable payload, used as a cache key
+def payload_key(payload):
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, name, maxsize=1024, disk_dir=None, ttl=None, disk_maxsize=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl  # Optional lifetime of in-memory entries, in seconds
+        self.disk_dir = disk_dir  # Optional on-disk tier for JSON-serializable values
+        self.disk_maxsize = disk_maxsize or 4 * maxsize  # Files kept on disk before the oldest are pruned
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        self.disk_files = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.disk_files = len(self._disk_entries())
+        CACHES[name] = self
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                value, expires_at = self.entries[key]
+                if expires_at is None or expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.expirations += 1
+
+        value = self._read_disk(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.disk_hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self._store(key, value)
+        self._write_disk(key, value)
+
+    def _store(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, "{}.json".format(key))
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key)) as file:
+                value = json.load(file)
+            os.utime(self._disk_path(key))  # Mark as recently used for pruning
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        # Write to a temporary file first so other workers never read a partial entry
+        tmp_path = "{}.{}.{}.tmp".format(self._disk_path(key), os.getpid(), threading.get_ident())
+        try:
+            is_new = not os.path.exists(self._disk_path(key))
+            with open(tmp_path, "w") as file:
+                json.dump(value, file)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            logger.warning("Could not write %s cache entry to disk: %s", self.name, e)
+            return
+        if is_new:
+            with self.disk_lock:
+                self.disk_files += 1
+                if self.disk_files > self.disk_maxsize:
+                    self._prune_disk()
+
+    # (mtime, path) of every entry file in the disk tier
+    def _disk_entries(self):
+        entries = []
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        pass  # Removed by another worker meanwhile
+        return entries
+
+    # Delete the least recently used files until the disk tier is back to
+    # 90% of disk_maxsize, so pruning runs once per many writes. The count is
+    # taken from the directory itself, as other workers share it.
+    def _prune_disk(self):
+        entries = sorted(self._disk_entries())
+        keep = int(self.disk_maxsize * 0.9)
+        for _, path in entries[:max(0, len(entries) - keep)]:
+            try:
+                os.remove(path)
+                self.disk_evictions += 1
+            except OSError:
+                pass
+        self.disk_files = min(len(entries), keep)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "diskSize": self.disk_files,
+                "diskMaxsize": self.disk_maxsize if self.disk_dir else 0,
+                "diskEvictions": self.disk_evictions,
+                "hitRate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({name: cache.stats() for name, cache in CACHES.items()})
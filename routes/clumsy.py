@@ -1,40 +1,143 @@
+import os
+
+import numpy as np
 from flask import Flask, request, jsonify
 
 from routes import app
+from routes.cache import LRUCache, payload_key
+
+class DictionaryIndex:
+    def __init__(self, dictionary):
+        self.words = list(dict.fromkeys(dictionary))  # Drop duplicates, keep order
+        # Every word's position in self.words under each of its one-letter
+        # wildcard forms, e.g. "cat" under "*at", "c*t" and "ca*"
+        self.wildcards = {}
+        for position, word in enumerate(self.words):
+            for i in range(len(word)):
+                self.wildcards.setdefault(word[:i] + '*' + word[i+1:], []).append(position)
+        self.positions = {word: position for position, word in enumerate(self.words)}
+        self._wildcard_tables = None
+
+    # Find the first dictionary word that differs from the mistype in exactly
+    # one character: one probe per position instead of trying every letter
+    def find_correction(self, mistype):
+        best = None
+        for i in range(len(mistype)):
+            for position in self.wildcards.get(mistype[:i] + '*' + mistype[i+1:], ()):
+                if self.words[position] != mistype:
+                    if best is None or position < best:
+                        best = position
+                    break
+        return None if best is None else self.words[best]
+
+    # Sorted wildcard keys for the vectorized batch mode. Characters are
+    # ranked 1..A within the dictionary's alphabet and a word of length L is
+    # packed into one uint64 of L fields; its wildcard form at position i is
+    # the same number with field i zeroed. For every distinct key we keep the
+    # lowest and second lowest dictionary positions sharing it. Lengths whose
+    # fields do not fit in 64 bits are left to find_correction.
+    def wildcard_tables(self):
+        if self._wildcard_tables is None:
+            alphabet = np.unique(encode_words(self.words))
+            bits = (len(alphabet) + 1).bit_length()
+            groups = {}
+            for position, word in enumerate(self.words):
+                if word and len(word) * bits <= 64:
+                    groups.setdefault(len(word), []).append(position)
+
+            tables = {}
+            none = len(self.words)
+            for length, positions in groups.items():
+                codes = encode_words([self.words[p] for p in positions]).reshape(-1, length)
+                keys = wildcard_keys(alphabet_ranks(codes, alphabet), bits)
+                order = np.argsort(keys, kind='stable')  # Ties stay in dictionary order
+                keys, owners = keys[order], np.tile(positions, length)[order]
+                unique_keys, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+                second = np.where(counts > 1, owners[np.minimum(starts + 1, len(owners) - 1)], none)
+                tables[length] = (unique_keys, owners[starts], second)
+            self._wildcard_tables = (alphabet, bits, tables)
+        return self._wildcard_tables
+
+    # Same answers as find_correction for many mistypes at once: every
+    # wildcard form of every mistype is looked up with one sorted
+    # searchsorted per length, and the lowest non-identical position wins
+    def correct_batch(self, mistypes):
+        alphabet, bits, tables = self.wildcard_tables()
+        none = len(self.words)
+        best = np.full(len(mistypes), none)
+        groups = {}
+        for i, mistype in enumerate(mistypes):
+            if mistype:
+                groups.setdefault(len(mistype), []).append(i)
+
+        for length, ids in groups.items():
+            if length not in tables:
+                if length * bits > 64:
+                    for i in ids:
+                        correction = self.find_correction(mistypes[i])
+                        best[i] = none if correction is None else self.positions[correction]
+                continue
+            unique_keys, first, second = tables[length]
+            codes = encode_words([mistypes[i] for i in ids]).reshape(-1, length)
+            queries = wildcard_keys(alphabet_ranks(codes, alphabet), bits)
+            exact = np.tile([self.positions.get(mistypes[i], -1) for i in ids], length)
+
+            order = np.argsort(queries)  # Sorted needles make searchsorted cache friendly
+            slots = np.empty(len(queries), dtype=np.int64)
+            slots[order] = np.searchsorted(unique_keys, queries[order])
+            slots = np.minimum(slots, len(unique_keys) - 1)
+            found = unique_keys[slots] == queries
+            candidate = np.where(first[slots] == exact, second[slots], first[slots])
+            candidate = np.where(found, candidate, none)
+            best[ids] = candidate.reshape(length, len(ids)).min(axis=0)
+
+        return [self.words[position] if position < none else None for position in best.tolist()]
+
+# Character codes of the concatenated words, as full code points
+def encode_words(words):
+    return np.frombuffer(''.join(words).encode('utf-32-le'), dtype=np.uint32)
+
+# Rank of every code in the dictionary alphabet, 1..A; characters outside the
+# alphabet get A + 1, which no dictionary key contains
+def alphabet_ranks(codes, alphabet):
+    slots = np.minimum(np.searchsorted(alphabet, codes), len(alphabet) - 1)
+    return np.where(alphabet[slots] == codes, slots + 1, len(alphabet) + 1).astype(np.uint64)
+
+# Packed wildcard keys of an (n, L) rank matrix: all forms for position 0,
+# then all for position 1, and so on
+def wildcard_keys(ranks, bits):
+    shifts = np.arange(ranks.shape[1], dtype=np.uint64) * np.uint64(bits)
+    packed = (ranks << shifts).sum(axis=1, dtype=np.uint64)
+    return (packed[None, :] - (ranks.T << shifts[:, None])).ravel()
 
-import string
+# Built indexes keyed by a content hash of the dictionary, so clients that
+# resend the same dictionary skip index construction; see /cache-stats
+dictionary_cache = LRUCache("clumsy-dictionaries", maxsize=int(os.environ.get("CLUMSY_CACHE_SIZE", 64)))
 
-# Generate all variants of a word by changing one character
-def generate_one_off_variants(word):
-    variants = set()
-    letters = string.ascii_lowercase
-    for i in range(len(word)):
-        for letter in letters:
-            if letter != word[i]:
-                # Replace character at position i with every possible letter
-                variant = word[:i] + letter + word[i+1:]
-                variants.add(variant)
-    return variants
+def dictionary_index(dictionary):
+    key = payload_key(dictionary)
+    index = dictionary_cache.get(key)
+    if index is None:
+        index = DictionaryIndex(dictionary)
+        dictionary_cache.put(key, index)
+    return index
 
 @app.route('/the-clumsy-programmer', methods=['POST'])
 def clumsy():
     data = request.get_json()
+    batch = request.args.get("mode") == "batch"
     results = []
 
     for entry in data:
-        dictionary = set(entry["dictionary"])  # Store the dictionary in a set for fast lookups
+        index = dictionary_index(entry["dictionary"])
         mistypes = entry["mistypes"]
-        corrections = []
 
-        for mistype in mistypes:
-            # Generate all possible variants of the mistyped word
-            variants = generate_one_off_variants(mistype)
-            # Check which variant exists in the dictionary
-            for variant in variants:
-                if variant in dictionary:
-                    corrections.append(variant)
-                    break  # Stop as soon as a correction is found
+        if batch:
+            found = index.correct_batch(mistypes)
+        else:
+            found = [index.find_correction(mistype) for mistype in mistypes]
+        corrections = [correction for correction in found if correction is not None]
 
         results.append({'corrections': corrections})
 
-    return jsonify(results)
\ No newline at end of file
+    return jsonify(results)
@@ -31,21 +31,78 @@ def grow_colony(colony, generations):
 def calculate_weight(colony):
     return sum(int(c) for c in colony)
 
+# Count how often each of the 100 adjacent digit pairs "ab" appears (index a * 10 + b)
+def count_pairs(colony):
+    counts = [0] * 100
+    for i in range(len(colony) - 1):
+        counts[int(colony[i]) * 10 + int(colony[i + 1])] += 1
+    return counts
+
+# Pair transition tables, one per weight residue: for weight % 10 == r, pair
+# "ab" spawns digit TRANSITIONS[r][ab][2] and becomes the pairs at indices
+# TRANSITIONS[r][ab][0] and TRANSITIONS[r][ab][1]
+def build_transitions():
+    transitions = []
+    for residue in range(10):
+        table = []
+        for pair in range(100):
+            a, b = divmod(pair, 10)
+            new_digit = (residue + calculate_signature(a, b)) % 10
+            table.append((a * 10 + new_digit, new_digit * 10 + b, new_digit))
+        transitions.append(tuple(table))
+    return tuple(transitions)
+
+TRANSITIONS = build_transitions()
+
+# Advance the pair counts and weight by a number of generations. Every pair
+# "ab" becomes "ad" and "db", so the next generation only depends on the pair
+# counts and the weight residue. Each generation is O(100).
+def advance_pairs(counts, weight, generations):
+    for _ in range(generations):
+        table = TRANSITIONS[weight % 10]
+        new_counts = [0] * 100
+        added = 0
+        for pair, count in enumerate(counts):
+            if not count:
+                continue
+            left, right, new_digit = table[pair]
+            new_counts[left] += count
+            new_counts[right] += count
+            added += new_digit * count
+        counts = new_counts
+        weight += added
+    return counts, weight
+
+# Grow the colony without building it and return its final weight
+def grow_colony_weight(colony, generations):
+    _, weight = advance_pairs(count_pairs(colony), calculate_weight(colony), generations)
+    return weight
+
+# Solve a whole batch of {colony, generations} items. Items sharing a colony
+# are grown once: the pair state jumps from one requested generation to the
+# next, so each distinct colony costs only its largest generation count.
+def grow_colonies(items):
+    by_colony = {}
+    for i, item in enumerate(items):
+        by_colony.setdefault(item['colony'], []).append((item['generations'], i))
+
+    weights = [0] * len(items)
+    for colony, requests in by_colony.items():
+        requests.sort()
+        counts, weight = count_pairs(colony), calculate_weight(colony)
+        reached = 0
+        for generations, i in requests:
+            counts, weight = advance_pairs(counts, weight, generations - reached)
+            reached = generations
+            weights[i] = weight
+    return weights
+
 @app.route('/digital-colony', methods=['POST'])
 def digital_colony():
     data = request.get_json()
     logging.info("Data received for evaluation: {}".format(data))
     
-    results = []
-
-    for item in data:
-        generations = item['generations']
-        colony = item['colony']
-        grown_colony = grow_colony(colony, generations)
-        final_weight = calculate_weight(grown_colony)
-
-        results.append(str(final_weight))
-        
+    results = [str(weight) for weight in grow_colonies(data)]
 
     logging.info("Results computed: {}".format(results))
     return json.dumps(results)
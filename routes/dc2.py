@@ -2,6 +2,7 @@ import json
 import logging
 from flask import Flask, request
 from routes import app
+from routes.dc import grow_colony_weight as grow_colony_pairs
 
 
 def calculate_signature(a, b):
@@ -35,6 +36,9 @@ def grow_colony_weight(colony, generations):
         
         return sum(colony)  # Return the final weight of the colony
 
+    # Longer runs use the digit-pair count engine instead of building the list
+    return grow_colony_pairs("".join(str(d) for d in colony), generations)
+
 
 @app.route('/digital-colony', methods=['POST'])
 def digital_colony():
@@ -47,9 +51,7 @@ def digital_colony():
         generations = item['generations']
         colony = item['colony']
         
-        grown_colony = grow_colony_weight(colony, generations)
-        
-        final_weight = sum(int(c) for c in grown_colony)
+        final_weight = grow_colony_weight(colony, generations)
         
         results.append(str(final_weight))
     
@@ -1,201 +1,458 @@
 from flask import Flask, request, jsonify
 import logging
+import os
 import re
 
 from routes import app
+from routes.cache import LRUCache, payload_key
 logger = logging.getLogger(__name__)
 
-variables = {}  # Store for variables
-
-# def eval_expression(expression, line_number):
-#     expression = expression.strip()
-    
-#     # Check for simple values like numbers, variables, or strings
-#     if expression.isdigit() or re.match(r'^-?\d+(\.\d+)?$', expression):
-#         return float(expression), None
-#     elif expression.startswith('"') and expression.endswith('"'):
-#         return expression[1:-1], None
-#     elif expression in variables:
-#         return float(variables[expression]), None
-#     elif expression.startswith('(') and expression.endswith(')'):
-#         # It's a sub-expression; we need to evaluate it
-#         return eval_function(expression, line_number)
-#     else:
-#         return None, f"ERROR at line {line_number}: Invalid expression '{expression}'"
-
-def eval_function(expression, line_number):
-    parts = re.findall(r'\(.*?\)|[^\s()]+', expression.strip('()'))
-    func_name = parts[0]
 
+class LispError(Exception):
+    pass
+
+
+# Variables of one program run. Each request gets its own environment, so
+# concurrent requests never share state and nothing outlives the request.
+class Environment:
+    def __init__(self):
+        self.variables = {}
+
+    def lookup(self, name):
+        if name not in self.variables:
+            raise LispError(f"Error: Undefined variable '{name}'")
+        return self.variables[name]
+
+    def define(self, name, value):
+        if name in self.variables:
+            raise LispError(f"Error: Variable '{name}' already defined")
+        self.variables[name] = value
+
+
+# Variable references in the AST; string literals stay plain str
+class Symbol(str):
+    pass
+
+
+# Number literals keep their source text, so (str 5) gives "5" rather than "5.0"
+class Number(float):
+    __slots__ = ('text',)
+
+    def __new__(cls, text):
+        number = super().__new__(cls, text)
+        number.text = text
+        return number
+
+
+TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|("[^"]*")|([^\s()"]+)|(\S))')
+
+
+def tokenize(source):
+    tokens = []
+    for open_paren, close_paren, string, atom, invalid in TOKEN_PATTERN.findall(source):
+        if invalid:
+            raise LispError("Unterminated string literal")
+        tokens.append(open_paren or close_paren or string or atom)
+    return tokens
+
+
+def parse_atom(token):
+    if token.startswith('"'):
+        return token[1:-1]
     try:
-        if func_name == "puts":
-            if len(parts) != 2 or not parts[1].startswith('"') or not parts[1].endswith('"'):
-                return None, "Error: puts expects a single string argument"
-            return parts[1][1:-1], None  # Strip quotes
-
-        elif func_name == "set":
-            if len(parts) != 3:
-                return None, "Error: Incorrect number of arguments for set"
-            var_name = parts[1]
-            if var_name in variables:
-                return None, f"Error: Variable '{var_name}' already defined"
-            variables[var_name] = parts[2]
-            return None, None
-
-        elif func_name == "concat":
-            if len(parts) != 3 or not all(p.startswith('"') and p.endswith('"') for p in parts[1:]):
-                return None, "Error: concat expects two string arguments"
-            return parts[1][1:-1] + parts[2][1:-1], None
-
-        elif func_name == "lowercase":
-            if len(parts) != 2 or not parts[1].startswith('"') or not parts[1].endswith('"'):
-                return None, "Error: lowercase expects a single string argument"
-            return parts[1][1:-1].lower(), None
-
-        elif func_name == "uppercase":
-            if len(parts) != 2 or not parts[1].startswith('"') or not parts[1].endswith('"'):
-                return None, "Error: uppercase expects a single string argument"
-            return parts[1][1:-1].upper(), None
-        
-        # replace function
-        elif func_name == "replace":
-            if len(parts) != 4 or not all(p.startswith('"') and p.endswith('"') for p in parts[1:]):
-                return None, "Error: replace expects three string arguments"
-            source, target, replacement = parts[1][1:-1], parts[2][1:-1], parts[3][1:-1]
-            return source.replace(target, replacement), None
-
-        # substring function
-        elif func_name == "substring":
-            if len(parts) != 4 or not parts[1].startswith('"') or not parts[1].endswith('"'):
-                return None, "Error: substring expects a string and two numeric arguments"
-            try:
-                start, end = int(parts[2]), int(parts[3])
-                source = parts[1][1:-1]
-                if start < 0 or end > len(source) or start >= end:
-                    return None, "Error: Index out of bounds"
-                return source[start:end], None
-            except ValueError:
-                return None, "Error: Invalid index type"
-
-        # add function
-        elif func_name == "add":
-            try:
-                numbers = [float(x) for x in parts[1:]]
-                return round(sum(numbers), 4), None
-            except ValueError:
-                return None, "Error: add expects numeric arguments"
-
-        # subtract function
-        elif func_name == "subtract":
-            if len(parts) != 3:
-                return None, "Error: subtract expects two numeric arguments"
-            try:
-                result = float(parts[1]) - float(parts[2])
-                return round(result, 4), None
-            except ValueError:
-                return None, "Error: subtract expects numeric arguments"
+        return Number(token)  # Anything float() accepts, e.g. 1e2, .5 or +1
+    except ValueError:
+        return Symbol(token)
 
-        # multiply function
-        elif func_name == "multiply":
-            try:
-                result = 1
-                for num in parts[1:]:
-                    result *= float(num)
-                return round(result, 4), None
-            except ValueError:
-                return None, "Error: multiply expects numeric arguments"
-
-        # divide function
-        elif func_name == "divide":
-            if len(parts) != 3:
-                return None, "Error: divide expects two numeric arguments"
-            try:
-                dividend, divisor = float(parts[1]), float(parts[2])
-                if divisor == 0:
-                    return None, "Error: Division by zero"
-                result = dividend / divisor
-                return round(result, 4), None
-            except ValueError:
-                return None, "Error: divide expects numeric arguments"
-        # Absolute value function
-        elif func_name == "abs":
-            if len(parts) != 2:
-                return None, "Error: abs expects one numeric argument"
-            try:
-                return abs(float(parts[1])), None
-            except ValueError:
-                return None, "Error: abs expects a numeric argument"
 
-        # Max function
-        elif func_name == "max":
-            try:
-                numbers = [float(p) for p in parts[1:]]
-                return max(numbers), None
-            except ValueError:
-                return None, "Error: max expects numeric arguments"
+# Build the AST of a single expression: atoms become str, Number or Symbol
+# values and every (...) form becomes a tuple of its parsed elements
+def parse(source):
+    tokens = tokenize(source)
+    if not tokens:
+        raise LispError("Empty expression")
 
-        # Min function
-        elif func_name == "min":
-            try:
-                numbers = [float(p) for p in parts[1:]]
-                return min(numbers), None
-            except ValueError:
-                return None, "Error: min expects numeric arguments"
-
-        # Greater than (gt) function
-        elif func_name == "gt":
-            if len(parts) != 3:
-                return None, "Error: gt expects two numeric arguments"
-            try:
-                return float(parts[1]) > float(parts[2]), None
-            except ValueError:
-                return None, "Error: gt expects numeric arguments"
-
-        # Less than (lt) function
-        elif func_name == "lt":
-            if len(parts) != 3:
-                return None, "Error: lt expects two numeric arguments"
-            try:
-                return float(parts[1]) < float(parts[2]), None
-            except ValueError:
-                return None, "Error: lt expects numeric arguments"
-
-        # Equality check (equal) function
-        elif func_name == "equal":
-            if len(parts) != 3:
-                return None, "Error: equal expects two arguments"
-            return parts[1] == parts[2], None
-
-        # Not equal (not_equal) function
-        elif func_name == "not_equal":
-            if len(parts) != 3:
-                return None, "Error: not_equal expects two arguments"
-            return parts[1] != parts[2], None
-
-        # String conversion (str) function
-        elif func_name == "str":
-            if len(parts) != 2:
-                return None, "Error: str expects one argument"
-            return str(parts[1]), None
-
-        # Error handling for unknown functions
+    stack = [[]]
+    for token in tokens:
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            if len(stack) == 1:
+                raise LispError("Unexpected ')'")
+            form = tuple(stack.pop())
+            stack[-1].append(form)
         else:
-            return None, f"Error: Unknown function '{func_name}'"
+            stack[-1].append(parse_atom(token))
+
+    if len(stack) > 1:
+        raise LispError("Missing ')'")
+    if len(stack[0]) != 1:
+        raise LispError("Expected a single expression")
+    return stack[0][0]
+
+
+# Parsed programs, keyed by the hash of their source lines. A line that fails
+# to parse is kept as its LispError so it is reported when execution reaches it.
+program_cache = LRUCache("lisp-programs", maxsize=int(os.environ.get("LISP_PROGRAM_CACHE_SIZE", 256)))
+
+
+def parse_program(expressions):
+    key = payload_key(expressions)
+    program = program_cache.get(key)
+    if program is None:
+        program = []
+        for expression in expressions:
+            try:
+                program.append(parse(expression))
+            except LispError as e:
+                program.append(e.with_traceback(None))  # Keep no parse frames in the cache
+        program_cache.put(key, program)
+    return program
+
+
+def is_string(value):
+    return isinstance(value, str)
+
+
+def is_number(value):
+    return isinstance(value, float)
+
+
+def check_strings(args, count, message):
+    if len(args) != count or not all(is_string(arg) for arg in args):
+        raise LispError(message)
+
+
+def check_numbers(args, message):
+    if not all(is_number(arg) for arg in args):
+        raise LispError(message)
+
+
+def lisp_puts(args):
+    check_strings(args, 1, "Error: puts expects a single string argument")
+    return args[0]
+
+
+def lisp_concat(args):
+    check_strings(args, 2, "Error: concat expects two string arguments")
+    return args[0] + args[1]
+
+
+def lisp_lowercase(args):
+    check_strings(args, 1, "Error: lowercase expects a single string argument")
+    return args[0].lower()
+
+
+def lisp_uppercase(args):
+    check_strings(args, 1, "Error: uppercase expects a single string argument")
+    return args[0].upper()
+
+
+def lisp_replace(args):
+    check_strings(args, 3, "Error: replace expects three string arguments")
+    source, target, replacement = args
+    return source.replace(target, replacement)
+
+
+# Integer index from a substring argument: literals must be written as
+# integers, computed values must be whole numbers
+def index_value(value):
+    try:
+        if isinstance(value, Number):
+            return int(value.text)
+        if is_number(value) and value.is_integer():
+            return int(value)
+    except ValueError:
+        pass
+    raise LispError("Error: Invalid index type")
+
+
+def lisp_substring(args):
+    if len(args) != 3 or not is_string(args[0]):
+        raise LispError("Error: substring expects a string and two numeric arguments")
+    source, start, end = args
+    start, end = index_value(start), index_value(end)
+    if start < 0 or end > len(source) or start >= end:
+        raise LispError("Error: Index out of bounds")
+    return source[start:end]
+
+
+def lisp_add(args):
+    check_numbers(args, "Error: add expects numeric arguments")
+    return round(sum(args), 4)
 
+
+def lisp_subtract(args):
+    if len(args) != 2:
+        raise LispError("Error: subtract expects two numeric arguments")
+    check_numbers(args, "Error: subtract expects numeric arguments")
+    return round(args[0] - args[1], 4)
+
+
+def lisp_multiply(args):
+    check_numbers(args, "Error: multiply expects numeric arguments")
+    result = 1
+    for num in args:
+        result *= num
+    return round(result, 4)
+
+
+def lisp_divide(args):
+    if len(args) != 2:
+        raise LispError("Error: divide expects two numeric arguments")
+    check_numbers(args, "Error: divide expects numeric arguments")
+    dividend, divisor = args
+    if divisor == 0:
+        raise LispError("Error: Division by zero")
+    return round(dividend / divisor, 4)
+
+
+def lisp_abs(args):
+    if len(args) != 1:
+        raise LispError("Error: abs expects one numeric argument")
+    check_numbers(args, "Error: abs expects a numeric argument")
+    return abs(args[0])
+
+
+def lisp_max(args):
+    if not args:
+        raise LispError("Error: max expects numeric arguments")
+    check_numbers(args, "Error: max expects numeric arguments")
+    return max(args)
+
+
+def lisp_min(args):
+    if not args:
+        raise LispError("Error: min expects numeric arguments")
+    check_numbers(args, "Error: min expects numeric arguments")
+    return min(args)
+
+
+def lisp_gt(args):
+    if len(args) != 2:
+        raise LispError("Error: gt expects two numeric arguments")
+    check_numbers(args, "Error: gt expects numeric arguments")
+    return args[0] > args[1]
+
+
+def lisp_lt(args):
+    if len(args) != 2:
+        raise LispError("Error: lt expects two numeric arguments")
+    check_numbers(args, "Error: lt expects numeric arguments")
+    return args[0] < args[1]
+
+
+def lisp_equal(args):
+    if len(args) != 2:
+        raise LispError("Error: equal expects two arguments")
+    return args[0] == args[1]
+
+
+def lisp_not_equal(args):
+    if len(args) != 2:
+        raise LispError("Error: not_equal expects two arguments")
+    return args[0] != args[1]
+
+
+def lisp_str(args):
+    if len(args) != 1:
+        raise LispError("Error: str expects one argument")
+    value = args[0]
+    return value.text if isinstance(value, Number) else str(value)
+
+
+# Builtins receive their arguments already evaluated
+BUILTINS = {
+    "puts": lisp_puts,
+    "concat": lisp_concat,
+    "lowercase": lisp_lowercase,
+    "uppercase": lisp_uppercase,
+    "replace": lisp_replace,
+    "substring": lisp_substring,
+    "add": lisp_add,
+    "subtract": lisp_subtract,
+    "multiply": lisp_multiply,
+    "divide": lisp_divide,
+    "abs": lisp_abs,
+    "max": lisp_max,
+    "min": lisp_min,
+    "gt": lisp_gt,
+    "lt": lisp_lt,
+    "equal": lisp_equal,
+    "not_equal": lisp_not_equal,
+    "str": lisp_str,
+}
+
+
+def lisp_set(args, env):
+    if len(args) != 2 or not isinstance(args[0], Symbol):
+        raise LispError("Error: Incorrect number of arguments for set")
+    env.define(args[0], evaluate(args[1], env))
+    return None
+
+
+# Special forms receive their arguments unevaluated, along with the environment
+SPECIAL_FORMS = {
+    "set": lisp_set,
+}
+
+
+def evaluate(node, env):
+    if isinstance(node, Symbol):
+        return env.lookup(node)
+    if not isinstance(node, tuple):
+        return node  # String or number literal
+
+    if not node:
+        raise LispError("Error: Empty expression")
+    func_name, args = node[0], node[1:]
+    if func_name in SPECIAL_FORMS:
+        return SPECIAL_FORMS[func_name](args, env)
+    if func_name not in BUILTINS:
+        raise LispError(f"Error: Unknown function '{func_name}'")
+    return BUILTINS[func_name]([evaluate(arg, env) for arg in args])
+
+
+# Evaluate one parsed expression of the program, returning (result, error)
+def eval_function(node, line_number, env):
+    if isinstance(node, LispError):
+        return None, f"ERROR at line {line_number}: {node}"
+    try:
+        return evaluate(node, env), None
+    except LispError as e:
+        return None, str(e)
     except Exception as e:
         return None, f"ERROR at line {line_number}: {str(e)}"
 
 
+# Bytecode for the optional VM. Each line compiles to a flat list of
+# (opcode, argument) pairs: literals are stored as ready-made constants,
+# variables as slot indices and calls as (builtin, argument count). Errors
+# known at compile time are stored as (exception type, message) and raised
+# afresh on every run, so cached code never holds a request's traceback.
+CONST, LOAD, STORE, CALL, RAISE = range(5)
+UNSET = object()  # Value of a slot whose variable has not been set yet
+
+
+def compile_node(node, code, slots):
+    if isinstance(node, Symbol):
+        code.append((LOAD, slots.setdefault(node, len(slots))))
+    elif not isinstance(node, tuple):
+        code.append((CONST, node))
+    elif not node:
+        code.append((RAISE, (LispError, "Error: Empty expression")))
+    elif node[0] == "set":
+        if len(node) != 3 or not isinstance(node[1], Symbol):
+            code.append((RAISE, (LispError, "Error: Incorrect number of arguments for set")))
+            return
+        compile_node(node[2], code, slots)
+        code.append((STORE, slots.setdefault(node[1], len(slots))))
+    elif node[0] not in BUILTINS:
+        code.append((RAISE, (LispError, f"Error: Unknown function '{node[0]}'")))
+    else:
+        for arg in node[1:]:
+            compile_node(arg, code, slots)
+        code.append((CALL, (BUILTINS[node[0]], len(node) - 1)))
+
+
+# Compile every line of a parsed program. Slots are shared by all lines, so a
+# variable set on one line is read by index on the next.
+def compile_program(program):
+    slots = {}
+    lines = []
+    for node in program:
+        if isinstance(node, LispError):
+            lines.append(node)
+            continue
+        code = []
+        try:
+            compile_node(node, code, slots)
+        except RecursionError as e:
+            code = [(RAISE, (RecursionError, str(e)))]
+        lines.append(code)
+    slot_names = sorted(slots, key=slots.get)
+    return lines, slot_names
+
+
+bytecode_cache = LRUCache("lisp-bytecode", maxsize=int(os.environ.get("LISP_PROGRAM_CACHE_SIZE", 256)))
+
+
+def compiled_program(expressions):
+    key = payload_key(expressions)
+    compiled = bytecode_cache.get(key)
+    if compiled is None:
+        compiled = compile_program(parse_program(expressions))
+        bytecode_cache.put(key, compiled)
+    return compiled
+
+
+def execute(code, slots, slot_names):
+    stack = []
+    for op, arg in code:
+        if op == CONST:
+            stack.append(arg)
+        elif op == CALL:
+            func, argc = arg
+            if argc:
+                args = stack[-argc:]
+                del stack[-argc:]
+            else:
+                args = []
+            stack.append(func(args))
+        elif op == LOAD:
+            value = slots[arg]
+            if value is UNSET:
+                raise LispError(f"Error: Undefined variable '{slot_names[arg]}'")
+            stack.append(value)
+        elif op == STORE:
+            if slots[arg] is not UNSET:
+                raise LispError(f"Error: Variable '{slot_names[arg]}' already defined")
+            slots[arg] = stack.pop()
+            stack.append(None)
+        else:
+            error_type, message = arg
+            raise error_type(message)
+    return stack.pop()
+
+
+# VM counterpart of the eval_function loop; the slot list is the per-request environment
+def run_compiled(compiled):
+    lines, slot_names = compiled
+    slots = [UNSET] * len(slot_names)
+    output = []
+
+    for i, code in enumerate(lines):
+        if isinstance(code, LispError):
+            output.append(f"ERROR at line {i + 1}: {code}")
+            break
+        try:
+            result = execute(code, slots, slot_names)
+        except LispError as e:
+            output.append(str(e))
+            break
+        except Exception as e:
+            output.append(f"ERROR at line {i + 1}: {str(e)}")
+            break
+        if result is not None:
+            output.append(str(result))
+
+    return output
+
+
 @app.route('/lisp-parser', methods=['POST'])
 def interpret():
     data = request.get_json()
     expressions = data.get('expressions', [])
+    if request.args.get("mode") == "vm":
+        return jsonify({"output": run_compiled(compiled_program(expressions))})
+
     output = []
-    
-    for i, expression in enumerate(expressions):
-        logging.info("data sent for evaluation {}".format(expression))
+    env = Environment()
+
+    for i, node in enumerate(parse_program(expressions)):
+        logging.info("data sent for evaluation {}".format(expressions[i]))
 
-        result, error = eval_function(expression, i + 1)
+        result, error = eval_function(node, i + 1, env)
         logging.info(result)
         if result is not None:
             output.append(str(result))
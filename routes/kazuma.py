@@ -1,5 +1,6 @@
 import math
 
+import numpy as np
 from flask import Flask, request, jsonify
 
 from routes import app
@@ -22,80 +23,85 @@ file_handler.setFormatter(formatter)  # Apply the formatter to the handler
 # Add the file handler to the logger
 logger.addHandler(file_handler)
 
-class Node:
-    def __init__(self, state, gold, parent=None):
-        self.state = state  # "charged", "uncharged"
-        self.gold = gold  # Current gold
-        self.parent = parent  # Reference to the parent node
-        self.children = []  # List of child nodes (next possible actions)
-
-    def add_child(self, child_node):
-        self.children.append(child_node)
-
-
-def build_tree(node, monsters, idx):
-    # Base case: if no more enemies, stop building the tree
-    if idx >= len(monsters):
-        return
-
-    # Branching from "uncharged"
-    if node.state == "uncharged":
-        # Check the parent's state to apply the rule
-        if node.parent is None or node.parent.state != "charged":
-            # Kazuma can either remain at base or charge if the parent state wasn't "uncharged"
-            uncharge_node = Node("uncharged", node.gold, parent=node)
-            charge_node = Node("charged", node.gold - monsters[idx], parent=node)
-            node.add_child(uncharge_node)
-            node.add_child(charge_node)
-
-            # Recursively build from these states
-            build_tree(uncharge_node, monsters, idx + 1)
-            build_tree(charge_node, monsters, idx + 1)
+# Walk the monsters once keeping the best gold for each of Kazuma's states:
+#   rested   - uncharged and free to start charging
+#   cooldown - just attacked, must stay uncharged for one more step
+#   charged  - charging, paid for the charge at the previous monster
+def max_efficiency(monsters):
+    rested, cooldown, charged = 0, -math.inf, -math.inf
+    for monster in monsters:
+        rested, cooldown, charged = (
+            max(rested, cooldown),           # stay at base
+            charged + monster,               # attack with the charge
+            max(rested - monster, charged),  # start or keep charging
+        )
+    return max(rested, cooldown, charged)
+
+
+# Lists with fewer members than this in their length bucket run through the
+# scalar DP; stepping numpy arrays of a handful of rows is slower than Python
+MIN_BATCH_ROWS = 8
+
+
+# Whether a monster list can be packed into int64 without truncating
+# fractional values or overflowing the running gold totals
+def packs_as_int64(monsters):
+    if not all(type(monster) is int for monster in monsters):
+        return False
+    return not monsters or max(map(abs, monsters)) * (len(monsters) + 1) < 2 ** 62
+
+
+# Step max_efficiency for lists of equal padded length in lock-step. The lists
+# are packed into one zero-padded array; trailing zero monsters never change
+# the best gold.
+def packed_max_efficiency(monster_lists):
+    length = max(len(monsters) for monsters in monster_lists)
+    packed = np.zeros((len(monster_lists), length), dtype=np.int64)
+    for i, monsters in enumerate(monster_lists):
+        packed[i, :len(monsters)] = monsters
+
+    unreachable = np.iinfo(np.int64).min // 2
+    rested = np.zeros(len(monster_lists), dtype=np.int64)
+    cooldown = np.full(len(monster_lists), unreachable, dtype=np.int64)
+    charged = np.full(len(monster_lists), unreachable, dtype=np.int64)
+    for column in packed.T:
+        rested, cooldown, charged = (
+            np.maximum(rested, cooldown),
+            charged + column,
+            np.maximum(rested - column, charged),
+        )
+    return np.maximum(np.maximum(rested, cooldown), charged).tolist()
+
+
+# Run max_efficiency for many monster lists at once. Integer lists are
+# bucketed by the next power of two of their length, so padding at most
+# doubles the memory of each bucket, and each bucket is packed and stepped
+# together. Non-integer lists and sparse buckets use the scalar DP.
+def batch_max_efficiency(monster_lists):
+    results = [0] * len(monster_lists)
+    buckets = {}
+    for i, monsters in enumerate(monster_lists):
+        if packs_as_int64(monsters):
+            buckets.setdefault(len(monsters).bit_length(), []).append(i)
         else:
-            # If the parent is "uncharged," only stay is allowed
-            uncharge_node = Node("uncharged", node.gold, parent=node)
-            node.add_child(uncharge_node)
-            build_tree(uncharge_node, monsters, idx + 1)
+            results[i] = max_efficiency(monsters)
 
-    # Branching from "charged"
-    elif node.state == "charged":
-        # Kazuma can either stay (remain charging) or attack
-        uncharge_node = Node("uncharged", node.gold + monsters[idx], parent=node)
-        charge_node = Node("charged", node.gold, parent=node)
-        node.add_child(uncharge_node)
-        node.add_child(charge_node)
-
-        # Recursively build from these states
-        build_tree(uncharge_node, monsters, idx + 1)
-        build_tree(charge_node, monsters, idx + 1)
-
-
-def build_kazuma_tree(monsters):
-    root = Node("uncharged", 0)  # Start at base with 0 gold and the first enemy
-    build_tree(root, monsters, 0)
-    return root
-
-
-# Traverse the tree and find the highest gold value
-def find_max_gold(node):
-    # Base case: if this node has no children, return its gold value
-    if not node.children:
-        return node.gold
-
-    # Recurse through children to find the maximum gold value
-    return max(find_max_gold(child) for child in node.children)
+    for indices in buckets.values():
+        if len(indices) < MIN_BATCH_ROWS:
+            for i in indices:
+                results[i] = max_efficiency(monster_lists[i])
+            continue
+        efficiencies = packed_max_efficiency([monster_lists[i] for i in indices])
+        for i, efficiency in zip(indices, efficiencies):
+            results[i] = efficiency
+    return results
 
 
 @app.route('/efficient-hunter-kazuma', methods=['POST'])
 def efficient_hunter_kazuma():
     data = request.get_json()
-    results = []
-
-    for entry in data:
-        monsters = entry["monsters"]
-        tree_root = build_kazuma_tree(monsters)
-        max_gold = find_max_gold(tree_root)
-        results.append({"efficiency": max_gold})
+    efficiencies = batch_max_efficiency([entry["monsters"] for entry in data])
+    results = [{"efficiency": efficiency} for efficiency in efficiencies]
 
     return jsonify(results)
 
@@ -1,8 +1,9 @@
 import json
 import logging
 
-from flask import Flask, request, jsonify
-from datetime import datetime, timedelta
+from flask import Flask, Response, request, jsonify, stream_with_context
+from datetime import datetime, time, timedelta
+from functools import lru_cache
 from pytz import timezone
 
 from routes import app
@@ -18,92 +19,137 @@ def calculate_mailtime():
     
     return jsonify(response_times)
 
+# NDJSON variant of /mailtime for long threads. The first line holds the users
+# ({"users": [...]}), every further line is one email, in time order. A
+# {"emit": true} line writes the averages so far; the final averages are
+# written when the stream ends.
+@app.route('/mailtime/stream', methods=['POST'])
+def stream_mailtime():
+    def generate():
+        accumulator = None
+        for line in request.stream:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if accumulator is None:
+                accumulator = ResponseTimeAccumulator(item['users'], advanced=True)
+            elif item.get('emit'):
+                yield json.dumps(accumulator.result()) + "\n"
+            else:
+                accumulator.add_email(item)
+        if accumulator is not None:
+            yield json.dumps(accumulator.result()) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Process-wide cache of timezone objects, shared by every request
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    return timezone(name)
+
+# Running per-sender response time totals for a thread whose emails arrive
+# in time order. Each email is folded in as it comes, so a thread never has to
+# be held in memory; result() can be read at any point.
+class ResponseTimeAccumulator:
+    def __init__(self, users, advanced=False):
+        # Resolve every user's office hours and timezone once
+        self.office_hours = {
+            user['name']: (get_timezone(user['officeHours']['timeZone']), user['officeHours']['start'], user['officeHours']['end'])
+            for user in users
+        }
+        self.advanced = advanced
+        self.response_times = {}
+        self.response_counts = {}
+        self.previous = None  # (sender, timeSent) of the last email seen
+
+    def add(self, sender, time_sent):
+        if self.previous is not None:
+            receiver, previous_time = self.previous
+            response_time = (time_sent - previous_time).total_seconds()
+
+            if self.advanced:
+                # Working time is counted in the office hours of the receiver
+                previous_tz, prev_start, prev_end = self.office_hours[receiver]
+                response_time = calculate_working_time(previous_time.astimezone(previous_tz), time_sent, prev_start, prev_end)
+
+            if sender not in self.response_times:
+                self.response_times[sender] = 0
+                self.response_counts[sender] = 0
+
+            self.response_times[sender] += response_time
+            self.response_counts[sender] += 1
+
+        self.previous = (sender, time_sent)
+
+    def add_email(self, email):
+        self.add(email['sender'], datetime.fromisoformat(email['timeSent']))
+
+    def result(self):
+        result = {}
+        for user, total_time in self.response_times.items():
+            result[user] = round(total_time / self.response_counts[user])
+        return {"response": result}
+
 def calculate_response_times(data, advanced=False):
     emails = data['emails']
-    users = {user['name']: user['officeHours'] for user in data['users']}
-
-    # Sort emails by timeSent
-    emails.sort(key=lambda x: datetime.fromisoformat(x['timeSent']))
-    
-    response_times = {}
-    response_counts = {}
-
-    def get_user_office_hours(user_name):
-        user_info = users[user_name]
-        tz = timezone(user_info['timeZone'])
-        start = user_info['start']
-        end = user_info['end']
-        return tz, start, end
-
-    for i in range(1, len(emails)):
-        previous_email = emails[i - 1]
-        current_email = emails[i]
-
-        sender = current_email['sender']
-        receiver = previous_email['sender']
-
-        previous_time = datetime.fromisoformat(previous_email['timeSent'])
-        current_time = datetime.fromisoformat(current_email['timeSent'])
-        
-        response_time = (current_time - previous_time).total_seconds()
-
-        if advanced:
-            previous_tz, prev_start, prev_end = get_user_office_hours(receiver)
-            current_tz, curr_start, curr_end = get_user_office_hours(sender)
-
-            previous_time = previous_time.astimezone(previous_tz)
-            current_time = current_time.astimezone(current_tz)
-
-            response_time = calculate_working_time(previous_time, current_time, prev_start, prev_end, curr_start, curr_end)
-
-        if sender not in response_times:
-            response_times[sender] = 0
-            response_counts[sender] = 0
-        
-        response_times[sender] += response_time
-        response_counts[sender] += 1
-
-    result = {}
-    for user, total_time in response_times.items():
-        result[user] = round(total_time / response_counts[user])
-
-    return {"response": result}
-
-def calculate_working_time(start_time, end_time, start_hour, end_hour, user_start, user_end):
-    working_seconds = 0
+    accumulator = ResponseTimeAccumulator(data['users'], advanced)
+
+    # Parse every timeSent once, then sort on the epoch seconds
+    sent = [datetime.fromisoformat(email['timeSent']) for email in emails]
+    epochs = [time_sent.timestamp() for time_sent in sent]
+    for i in sorted(range(len(emails)), key=epochs.__getitem__):
+        accumulator.add(emails[i]['sender'], sent[i])
+
+    return accumulator.result()
+
+# Office-hours boundary on a given local day. pytz zones need localize() to
+# pick the UTC offset that is in force on that day; it is slow, and emails in
+# a thread share days, so boundaries are cached.
+@lru_cache(maxsize=65536)
+def local_time(tz, day, hour):
+    naive = datetime.combine(day, time()) + timedelta(hours=hour)
+    if hasattr(tz, 'localize'):
+        return tz.localize(naive)
+    return naive.replace(tzinfo=tz)
+
+# Number of Monday-Friday dates in [first, last)
+def count_weekdays(first, last):
+    days = (last - first).days
+    if days <= 0:
+        return 0
+    weeks, extra = divmod(days, 7)
+    return weeks * 5 + sum(1 for i in range(extra) if (first.weekday() + i) % 7 < 5)
 
+# Seconds of the [start_of_work, end_of_work) window on a local day that fall within [start_time, end_time)
+def working_seconds_on(tz, day, start_time, end_time, start_hour, end_hour):
+    if day.weekday() >= 5:  # 5 = Saturday, 6 = Sunday
+        return 0
+    start_of_work = max(local_time(tz, day, start_hour), start_time)
+    end_of_work = min(local_time(tz, day, end_hour), end_time)
+    return max(0, (end_of_work - start_of_work).total_seconds())
+
+# Working time between two moments, counted in the office hours of start_time's
+# timezone. Only the first and last local days are handled explicitly; every
+# weekday in between contributes a full office day, so the cost does not
+# depend on how far apart the two moments are.
+def calculate_working_time(start_time, end_time, start_hour, end_hour, user_start=None, user_end=None):
     # If the start time is after end time, there is no working time
     if start_time >= end_time:
         return 0
 
-    # Calculate working time in seconds
-    current_time = start_time
-
-    # Loop through each time slice until the end time
-    while current_time < end_time:
-        # If it's a weekend, skip to the next Monday
-        if current_time.weekday() >= 5:  # 5 = Saturday, 6 = Sunday
-            current_time += timedelta(days=(7 - current_time.weekday()))
-            continue
-
-        # Check if current time is within working hours
-        start_of_work = current_time.replace(hour=start_hour, minute=0, second=0, microsecond=0)
-        end_of_work = current_time.replace(hour=end_hour, minute=0, second=0, microsecond=0)
-
-        if current_time < start_of_work:
-            current_time = start_of_work
-        
-        # If we're still within working hours
-        if current_time < end_of_work:
-            # Calculate the time spent in working hours
-            working_end = min(end_of_work, end_time)
-            working_seconds += (working_end - current_time).total_seconds()
-            current_time = working_end
-
-        # If we reach the end of working hours, go to the next day
-        if current_time >= end_of_work:
-            current_time += timedelta(days=1)
-            current_time = current_time.replace(hour=start_hour, minute=0)
+    tz = start_time.tzinfo
+    first_day = start_time.date()
+    last_day = end_time.astimezone(tz).date()
+
+    if first_day == last_day:
+        return working_seconds_on(tz, first_day, start_time, end_time, start_hour, end_hour)
+
+    working_seconds = working_seconds_on(tz, first_day, start_time, end_time, start_hour, end_hour)
+    working_seconds += working_seconds_on(tz, last_day, start_time, end_time, start_hour, end_hour)
+
+    # DST changes happen outside office hours, so every full office day is the same length
+    full_days = count_weekdays(first_day + timedelta(days=1), last_day)
+    working_seconds += full_days * max(0, end_hour - start_hour) * 3600
 
     return working_seconds
 
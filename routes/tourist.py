@@ -1,9 +1,13 @@
 import json
 import logging
+import os
+import time
 
+import numpy as np
 from flask import request
 
 from routes import app
+from routes.cache import LRUCache, payload_key
 
 from constants.tourist import TRAVELLING_TIME, TRAIN_LINES
 from collections import deque
@@ -205,76 +209,144 @@ def dijkstra(graph, start):
     
     return dist
 
-# Get shortest paths between key stations using Dijkstra's algorithm
-def get_shortest_paths(graph, key_stations):
+# All-pairs shortest travel times over the static metro graph, indexed by
+# STATION_INDEX. Set TOURIST_TRAVEL_TIMES_CACHE to a file path to load the
+# matrix from (or save it to) a JSON cache instead of recomputing it on startup.
+def build_travel_times(graph):
+    stations = sorted(graph)
+    travel_times = []
+    for station in stations:
+        dist = dijkstra(graph, station)
+        travel_times.append([dist[other] for other in stations])
+    return stations, travel_times
+
+# The cache file is only reused when it was built from the same network,
+# identified by network_key (a hash of the line and travel time tables)
+def load_travel_times(graph, network_key, cache_path=None):
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as file:
+            cached = json.load(file)
+        if cached.get("network") == network_key:
+            return cached["stations"], cached["travel_times"]
+        logger.info("Travel time cache %s is stale, rebuilding", cache_path)
+
+    stations, travel_times = build_travel_times(graph)
+    if cache_path:
+        tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        with open(tmp_path, "w") as file:
+            json.dump({"network": network_key, "stations": stations, "travel_times": travel_times}, file)
+        os.replace(tmp_path, cache_path)
+    return stations, travel_times
+
+NETWORK_KEY = payload_key([TRAIN_LINES, TRAVELLING_TIME])
+STATIONS, TRAVEL_TIMES = load_travel_times(graph, NETWORK_KEY, os.environ.get("TOURIST_TRAVEL_TIMES_CACHE"))
+STATION_INDEX = {station: idx for idx, station in enumerate(STATIONS)}
+
+def travel_time(a, b):
+    if a == b:
+        return 0
+    if a not in STATION_INDEX or b not in STATION_INDEX:
+        return float('inf')
+    return TRAVEL_TIMES[STATION_INDEX[a]][STATION_INDEX[b]]
+
+# Get shortest paths between key stations from the precomputed matrix
+def get_shortest_paths(key_stations):
     shortest_paths = {}
     
     for station in key_stations:
-        shortest_paths[station] = dijkstra(graph, station)
+        shortest_paths[station] = {other: travel_time(station, other) for other in key_stations}
     
     return shortest_paths
 
-def maximize_satisfaction_dp(locations, graph, starting_point, time_limit):
+# Largest number of (mask, u, v) candidates expanded at once in the DP below
+DP_CHUNK_SIZE = 1 << 20
+
+def maximize_satisfaction_dp(locations, starting_point, time_limit):
     # Get key locations (stations with satisfaction)
     
-    # Precompute shortest paths between key stations
-    shortest_paths = get_shortest_paths(graph, locations)
+    # Look up shortest paths between key stations
+    shortest_paths = get_shortest_paths(locations)
     
     # Map stations to indices for bitmasking
     station_idx = {station: idx for idx, station in enumerate(locations)}
     idx_station = {idx: station for station, idx in station_idx.items()}
     n = len(locations)
     
-    # Dynamic Programming table: dp[mask][i] = (max_satisfaction, remaining_time)
-    dp = [[(-float('inf'), 0)] * n for _ in range(1 << n)]
-    prev_station = [[-1] * n for _ in range(1 << n)]  # To store the previous station for backtracking
+    travel = np.array([[shortest_paths[idx_station[u]][idx_station[v]] for v in range(n)] for u in range(n)], dtype=float)
+    satisfaction = np.array([locations[idx_station[v]][0] for v in range(n)], dtype=float)
+    time_at_station = np.array([locations[idx_station[v]][1] for v in range(n)], dtype=float)
+    bits = 1 << np.arange(n)
     
     start_idx = station_idx[starting_point]
-    dp[1 << start_idx][start_idx] = (0, time_limit)  # Start at the starting point with time limit
+    return_to_start = travel[:, start_idx]
     
-    # Iterate over all possible masks (sets of visited stations)
-    for mask in range(1 << n):
-        for u in range(n):  # Station u
-            if dp[mask][u][0] == -float('inf'):  # Skip invalid states
-                continue
-            
-            current_satisfaction, remaining_time = dp[mask][u]
-            current_station = idx_station[u]
-            
-            # Try to go to all other unvisited stations
-            for v in range(n):
-                if mask & (1 << v):  # Skip if station v has already been visited
-                    continue
-                
-                next_station = idx_station[v]
-                travel_time = shortest_paths[current_station][next_station]
-                
-                if remaining_time - travel_time >= 0:  # Check if there's enough time to reach the next station
-                    satisfaction, time_at_station = locations.get(next_station, (0, 0))
-                    new_mask = mask | (1 << v)  # Mark the station as visited
-                    new_remaining_time = remaining_time - travel_time - time_at_station
-                    
-                    # Only update DP table if there's enough time to return to the start
-                    return_to_start_time = shortest_paths[next_station][starting_point]
-                    if new_remaining_time - return_to_start_time >= 0:  # Ensure enough time to return to start
-                        # Ensure we have time left to return
-                        if dp[new_mask][v][0] < current_satisfaction + satisfaction and new_remaining_time >= 0:
-                            dp[new_mask][v] = (current_satisfaction + satisfaction, new_remaining_time)
-                            prev_station[new_mask][v] = u  # Store the previous station
-    
-    # Find the maximum satisfaction when returning to the starting point
+    # The DP only stores masks that are actually reached, one popcount layer at
+    # a time. Each layer holds its sorted masks and tables indexed [row, i]: max
+    # satisfaction, remaining time and the previous station for backtracking.
+    # Every move adds one station, so layer k only feeds layer k + 1, and each
+    # (new_mask, v) is reached from the single mask new_mask ^ (1 << v).
+    masks = np.array([1 << start_idx])
+    dp_satisfaction = np.full((1, n), -np.inf)
+    dp_remaining = np.zeros((1, n))
+    dp_satisfaction[0, start_idx] = 0  # Start at the starting point with time limit
+    dp_remaining[0, start_idx] = time_limit
+    layers = [(masks, np.full((1, n), -1, dtype=np.int64))]
+    
+    # Best state that can still return to the starting point, tracked as the
+    # layers are built; ties go to the lowest (mask, u) like a full scan would
     best_satisfaction = 0
     best_final_state = (0, 0)
+    found = False
+    
+    chunk = max(1, DP_CHUNK_SIZE // (n * n))
+    while len(masks):
+        returnable = np.where(dp_remaining - return_to_start >= 0, dp_satisfaction, -np.inf)
+        row, u = divmod(int(returnable.argmax()), n)
+        value = returnable[row, u]
+        state = (int(masks[row]), u)
+        if value > best_satisfaction or (found and value == best_satisfaction and state < best_final_state):
+            best_satisfaction, best_final_state, found = value.item(), state, True
+        
+        # Expand the layer in chunks of rows to bound the [row, u, v] arrays
+        expanded = []
+        for chunk_start in range(0, len(masks), chunk):
+            chunk_rows = slice(chunk_start, chunk_start + chunk)
+            
+            # Candidates [row, u, v]: move from station u to unvisited station v
+            current_satisfaction = dp_satisfaction[chunk_rows, :, None]
+            remaining_time = dp_remaining[chunk_rows, :, None]
+            new_remaining_time = remaining_time - travel - time_at_station
+            valid = (
+                (current_satisfaction > -np.inf)
+                & ((masks[chunk_rows, None] & bits) == 0)[:, None, :]  # v not visited yet
+                & (remaining_time - travel >= 0)  # enough time to reach v
+                & (new_remaining_time - return_to_start >= 0)  # and to return to start
+                & (new_remaining_time >= 0)
+            )
+            candidates = np.where(valid, current_satisfaction + satisfaction, -np.inf)
+            
+            # Keep the best u for every v; argmax picks the lowest u on ties, the
+            # same as scanning u in order and only replacing strictly better states
+            best_u = candidates.argmax(axis=1)
+            rows, vs = np.nonzero(valid.any(axis=1))
+            us = best_u[rows, vs]
+            expanded.append((
+                masks[chunk_rows][rows] | bits[vs], vs, us,
+                candidates[rows, us, vs], new_remaining_time[rows, us, vs],
+            ))
+        new_masks, vs, us, new_satisfaction, new_remaining = (
+            np.concatenate(column) for column in zip(*expanded)
+        )
+        
+        masks, new_rows = np.unique(new_masks, return_inverse=True)
+        dp_satisfaction = np.full((len(masks), n), -np.inf)
+        dp_remaining = np.zeros((len(masks), n))
+        prev_station = np.full((len(masks), n), -1, dtype=np.int64)
+        dp_satisfaction[new_rows, vs] = new_satisfaction
+        dp_remaining[new_rows, vs] = new_remaining
+        prev_station[new_rows, vs] = us
+        layers.append((masks, prev_station))
     
-    for mask in range(1 << n):
-        for u in range(n):
-            if dp[mask][u][0] > -float('inf'):  # Valid state
-                travel_time_back = shortest_paths[idx_station[u]][starting_point]
-                if dp[mask][u][1] - travel_time_back >= 0:  # Ensure enough time to return
-                    if dp[mask][u][0] > best_satisfaction:
-                        best_satisfaction = dp[mask][u][0]
-                        best_final_state = (mask, u)
-
     # Reconstruct the path and the total travel time
     best_mask, best_final_station = best_final_state
     path = []
@@ -284,7 +356,8 @@ def maximize_satisfaction_dp(locations, graph, starting_point, time_limit):
     # Backtrack from the final station
     while best_mask != 0:
         path.append(idx_station[current_station])
-        next_station = prev_station[best_mask][current_station]
+        layer_masks, layer_prev = layers[bin(best_mask).count('1') - 1]
+        next_station = int(layer_prev[np.searchsorted(layer_masks, best_mask), current_station])
         
         # Add travel time between current_station and next_station
         if next_station != -1:
@@ -295,17 +368,172 @@ def maximize_satisfaction_dp(locations, graph, starting_point, time_limit):
     
     path.reverse()  # Reverse to get the correct order
     
+    # Re-add the chosen stations' own values in visiting order, so the total
+    # has the same type and rounding as summing the input in Python
+    if found:
+        best_satisfaction = 0
+        for station in path[1:]:
+            best_satisfaction += locations[station][0]
+    
     # Finally, add the time to return to the starting point
     total_travel_time += shortest_paths[idx_station[best_final_station]][starting_point]
     path.append(starting_point)  # Return to the starting point
     
     return {"path": path, "satisfaction": best_satisfaction, "total_travel_time": total_travel_time}
 
+# The bitmask DP needs 2^n states; past this many locations /tourist switches
+# to the branch-and-bound solver below
+MAX_DP_LOCATIONS = 20
+BNB_TIME_BUDGET = float(os.environ.get("TOURIST_BNB_BUDGET", 1.0))  # seconds
+BNB_TIME_BUDGET_MAX = float(os.environ.get("TOURIST_BNB_BUDGET_MAX", 5.0))  # Cap on ?budget=, in seconds
+
+# Best-first branch-and-bound for the same problem as maximize_satisfaction_dp.
+# A partial route is bounded by its satisfaction plus a fractional knapsack of
+# the unvisited stations, where visiting v costs at least its stay plus the
+# cheapest way to travel into it. Search stops when the budget runs out;
+# "optimal" says whether the returned route was proven best.
+def maximize_satisfaction_bnb(locations, starting_point, time_limit, time_budget=BNB_TIME_BUDGET):
+    deadline = time.monotonic() + time_budget
+    shortest_paths = get_shortest_paths(locations)
+    stations = list(locations)
+    n = len(stations)
+    start_idx = stations.index(starting_point)
+    
+    travel = [[shortest_paths[a][b] for b in stations] for a in stations]
+    satisfaction = [locations[station][0] for station in stations]
+    time_at_station = [locations[station][1] for station in stations]
+    return_to_start = [travel[v][start_idx] for v in range(n)]
+    
+    # Stations in order of satisfaction per unit of time they cost at minimum
+    min_cost = [
+        time_at_station[v] + min((travel[u][v] for u in range(n) if u != v), default=0)
+        for v in range(n)
+    ]
+    by_ratio = sorted(
+        range(n),
+        key=lambda v: satisfaction[v] / min_cost[v] if min_cost[v] > 0 else float('inf'),
+        reverse=True,
+    )
+    
+    def upper_bound(current_satisfaction, remaining_time, mask):
+        bound = current_satisfaction
+        for v in by_ratio:
+            if mask & (1 << v) or satisfaction[v] <= 0:
+                continue
+            if min_cost[v] <= remaining_time:
+                bound += satisfaction[v]
+                remaining_time -= min_cost[v]
+            else:
+                return bound + satisfaction[v] * remaining_time / min_cost[v]
+        return bound
+    
+    # Seed the incumbent with a greedy route: keep moving to the feasible
+    # station with the best satisfaction per unit of time it costs
+    best_satisfaction = 0
+    best_path = [start_idx]
+    remaining_time, mask = time_limit, 1 << start_idx
+    while True:
+        u = best_path[-1]
+        options = []
+        for v in range(n):
+            if mask & (1 << v) or satisfaction[v] <= 0 or remaining_time - travel[u][v] < 0:
+                continue
+            new_remaining_time = remaining_time - travel[u][v] - time_at_station[v]
+            if new_remaining_time - return_to_start[v] >= 0 and new_remaining_time >= 0:
+                cost = travel[u][v] + time_at_station[v]
+                options.append((satisfaction[v] / cost if cost > 0 else float('inf'), -v, new_remaining_time))
+        if not options:
+            break
+        _, v, remaining_time = max(options)
+        best_path.append(-v)
+        mask |= 1 << -v
+        best_satisfaction += satisfaction[-v]
+    start_mask = 1 << start_idx
+    
+    # (mask, u) -> (satisfaction, remaining time) of the best partial route seen;
+    # routes that are no better in both are dominated and skipped
+    seen = {(start_mask, start_idx): (0, time_limit)}
+    counter = 0  # Tie-breaker so the heap never compares paths
+    heap = [(-upper_bound(0, time_limit, start_mask), counter, 0, time_limit, start_idx, start_mask, [start_idx])]
+    
+    while heap:
+        if -heap[0][0] <= best_satisfaction or time.monotonic() > deadline:
+            break
+        _, _, current_satisfaction, remaining_time, u, mask, path = heapq.heappop(heap)
+        if seen.get((mask, u)) != (current_satisfaction, remaining_time):
+            continue  # Superseded by a better route to the same state
+        
+        for v in range(n):
+            if mask & (1 << v):
+                continue
+            if remaining_time - travel[u][v] < 0:
+                continue
+            new_remaining_time = remaining_time - travel[u][v] - time_at_station[v]
+            if new_remaining_time - return_to_start[v] < 0 or new_remaining_time < 0:
+                continue
+            
+            new_satisfaction = current_satisfaction + satisfaction[v]
+            new_mask = mask | (1 << v)
+            previous = seen.get((new_mask, v))
+            if previous and previous[0] >= new_satisfaction and previous[1] >= new_remaining_time:
+                continue
+            if new_satisfaction > best_satisfaction:
+                best_satisfaction = new_satisfaction
+                best_path = path + [v]
+            
+            bound = upper_bound(new_satisfaction, new_remaining_time, new_mask)
+            if bound > best_satisfaction:
+                seen[(new_mask, v)] = (new_satisfaction, new_remaining_time)
+                counter += 1
+                heapq.heappush(heap, (-bound, counter, new_satisfaction, new_remaining_time, v, new_mask, path + [v]))
+    
+    optimal = not heap or -heap[0][0] <= best_satisfaction
+    
+    path = [stations[v] for v in best_path]
+    total_travel_time = sum(shortest_paths[a][b] for a, b in zip(path, path[1:]))
+    if len(path) > 1:
+        total_travel_time += shortest_paths[path[-1]][starting_point]
+        path.append(starting_point)  # Return to the starting point
+    
+    return {"path": path, "satisfaction": best_satisfaction, "total_travel_time": total_travel_time, "optimal": optimal}
+
+
+
+# Solved requests, keyed on the canonical request payload. Set TOURIST_CACHE_DIR
+# to also keep results on disk so they survive worker restarts; at most
+# TOURIST_CACHE_DISK_SIZE files are kept there.
+tourist_cache = LRUCache(
+    "tourist",
+    maxsize=int(os.environ.get("TOURIST_CACHE_SIZE", 1024)),
+    disk_dir=os.environ.get("TOURIST_CACHE_DIR"),
+    disk_maxsize=int(os.environ.get("TOURIST_CACHE_DISK_SIZE", 4096)),
+)
 
 @app.route('/tourist', methods=['POST'])
 def tourist():
     data = request.get_json()
     logging.info("data sent for evaluation {}".format(data))
-    result = maximize_satisfaction_dp(data['locations'], graph, data['startingPoint'], data['timeLimit'])
+    # ?solver=dp or ?solver=bnb picks a solver; by default the DP is used
+    # whenever the number of locations allows it
+    solver = request.args.get("solver")
+    if solver not in ("dp", "bnb"):
+        solver = "dp" if len(data['locations']) <= MAX_DP_LOCATIONS else "bnb"
+
+    # Location order decides tie-breaks in the DP, so it is part of the key
+    key = payload_key([solver, list(data['locations'].items()), data['startingPoint'], data['timeLimit']])
+    result = tourist_cache.get(key)
+    if result is None:
+        if solver == "dp":
+            result = maximize_satisfaction_dp(data['locations'], data['startingPoint'], data['timeLimit'])
+        else:
+            # Non-numeric budgets fall back to the default, large ones are capped
+            time_budget = request.args.get("budget", BNB_TIME_BUDGET, type=float)
+            if not time_budget >= 0:
+                time_budget = BNB_TIME_BUDGET
+            time_budget = min(time_budget, BNB_TIME_BUDGET_MAX)
+            result = maximize_satisfaction_bnb(data['locations'], data['startingPoint'], data['timeLimit'], time_budget)
+        # Only proven results are cached; a budget-limited answer could improve
+        if result.get("optimal", True):
+            tourist_cache.put(key, result)
     logging.info("My result :{}".format(result))
     return json.dumps(result)
\ No newline at end of file
@@ -1,90 +1,402 @@
 import json
 import logging
+import mmap
+import os
+import tempfile
+import threading
 
+import numpy as np
 from flask import Flask, request, jsonify
 
 from routes import app
+from routes.cache import LRUCache, payload_key
 
-# Load your word list
-WORD_LIST = []
-def load_words_from_file(file_path):
-    with open(file_path, 'r') as file:
-        words = [line.strip() for line in file.readlines()]
-    return words
+# The word list is packed into fixed-width 5-byte records next to words.txt
+# and memory-mapped on first use, so forked workers share the same pages
+WORDS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'words.txt')
+WORD_STORE_PATH = os.environ.get("WORDLE_WORD_STORE", os.path.splitext(WORDS_PATH)[0] + '.bin')
 
-# Usage
-file_path = 'words.txt'  # Replace with your actual file path
-WORD_LIST = load_words_from_file(file_path)
 
+def pack_words(text_path, store_path):
+    with open(text_path, 'r') as file:
+        words = [line.strip() for line in file if line.strip()]
+    tmp_path = "{}.{}.tmp".format(store_path, os.getpid())
+    with open(tmp_path, 'wb') as file:
+        file.write(''.join(words).encode('ascii'))
+    os.replace(tmp_path, store_path)
+
+
+class WordStore:
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.codes = np.frombuffer(self.data, dtype=np.uint8).reshape(-1, 5)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, w):
+        w = int(w)
+        return self.data[5 * w:5 * w + 5].decode('ascii')
+
+
+ALL_POSITIONS = range(5)
+
+# Bit-parallel index over the word store, bit w standing for words[w]:
+#   position_bits[i][c]  - words with letter c at position i
+#   min_count_bits[c][k] - words containing letter c at least k times
+def build_index(codes):
+    to_int = lambda mask: int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+    position_bits = [[to_int(codes[:, i] == ord('a') + c) for c in range(26)] for i in ALL_POSITIONS]
+    min_count_bits = []
+    for c in range(26):
+        counts = (codes == ord('a') + c).sum(axis=1)
+        min_count_bits.append([to_int(counts >= k) for k in range(6)])
+    return position_bits, min_count_bits
+
+
+class WordIndex:
+    def __init__(self, words):
+        self.words = words
+        self.position_bits, self.min_count_bits = build_index(words.codes)
+        self.all_words = (1 << len(words)) - 1
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def word_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = WordIndex(WordStore(word_store_path()))
+        return _index
+
+
+_private_dir = None
+
+
+# Directory for cache files that cannot be written next to words.txt: a
+# per-user subdirectory of the temp dir, or a fresh private directory when
+# that one is not owned by us or can be written by other users
+def private_cache_dir():
+    global _private_dir
+    if _private_dir is None:
+        path = os.path.join(tempfile.gettempdir(), "wordle-{}".format(os.getuid()))
+        try:
+            os.makedirs(path, mode=0o700, exist_ok=True)
+            info = os.lstat(path)
+            safe = os.path.isdir(path) and not os.path.islink(path) and info.st_uid == os.getuid() and not info.st_mode & 0o022
+        except OSError:
+            safe = False
+        _private_dir = path if safe else tempfile.mkdtemp(prefix="wordle-")
+    return _private_dir
+
+
+def count_words(text_path):
+    with open(text_path, 'r') as file:
+        return sum(1 for line in file if line.strip())
+
+
+# Path of an up-to-date word store, packing one if needed. A store is reused
+# only when it is newer than words.txt and holds exactly 5 bytes per word.
+# When the store next to words.txt cannot be written (e.g. a read-only
+# deploy) a copy is packed into private_cache_dir() instead.
+def word_store_path():
+    expected_size = 5 * count_words(WORDS_PATH)
+    for path in (WORD_STORE_PATH, None):
+        if path is None:
+            path = os.path.join(private_cache_dir(), os.path.basename(WORD_STORE_PATH))
+        if (os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(WORDS_PATH)
+                and os.path.getsize(path) == expected_size):
+            return path
+        try:
+            pack_words(WORDS_PATH, path)
+            return path
+        except OSError as e:
+            logging.warning("Could not write Wordle word store {}: {}".format(path, e))
+    raise OSError("No writable location for the Wordle word store")
+
+
+# Fold one guess and its evaluation into the (confirmed, possible, letters)
+# constraints, returning new constraints so cached ones are never modified
+def apply_evaluation(constraints, g, e):
+    confirmed, possible, letters = constraints
+    confirmed = list(confirmed)
+    possible = {letter: list(positions) for letter, positions in possible.items()}
+    letters = list(letters)
+    for j in range(5):
+        if e[j] == 'O':
+            confirmed[j] = g[j]
+        elif e[j] == 'X':
+            if possible.get(g[j]) == None:
+                possible[g[j]] = [i for i in range(5) if i != j]
+            else:
+                if j in possible[g[j]]:
+                    possible[g[j]].remove(j)  
+        elif e[j] == '-':
+            if g[j] not in confirmed and g[j] not in possible:    
+                letters[ord(g[j]) - ord('a')] = 0
+    return confirmed, possible, letters
+
+
+NO_CONSTRAINTS = ([''] * 5, {}, [5] * 26)
+
+
+def parse_constraints(guess_history, evaluation_history):
+    constraints = NO_CONSTRAINTS
+    for g, e in zip(guess_history, evaluation_history):
+        constraints = apply_evaluation(constraints, g, e)
+    return constraints
+
+
+# Words with a letter at one of its allowed positions that is not confirmed
+def yellow_bits(letter, positions, confirmed):
+    position_bits = word_index().position_bits
+    allowed = 0
+    for i in positions:
+        if confirmed[i] == '':
+            allowed |= position_bits[i][ord(letter) - ord('a')]
+    return allowed
+
+
+# Bitset of the words that satisfy the constraints, each one a bitwise AND:
+#   confirmed - the letter sits at that position
+#   possible  - a letter that is not confirmed anywhere sits at one of its
+#               still-allowed positions that is not confirmed
+#   letters   - a letter appears at most that many times
+def candidate_bits(confirmed, possible, letters):
+    index = word_index()
+    bits = index.all_words
+    for i in ALL_POSITIONS:
+        if confirmed[i] != '':
+            bits &= index.position_bits[i][ord(confirmed[i]) - ord('a')]
+
+    for letter, positions in possible.items():
+        if letter not in confirmed:
+            bits &= yellow_bits(letter, positions, confirmed)
+
+    for c in range(26):
+        if letters[c] < 5:
+            bits &= ~index.min_count_bits[c][letters[c] + 1]
+    return bits
+
+
+# Only the constraints touched by one guess, given the constraints after it.
+# The others were already applied to the previous survivors, so unless the
+# guess loosens a constraint (see loosens_constraints), previous survivors &
+# evaluation_bits(...) equals a full candidate_bits.
+def evaluation_bits(constraints, g, e):
+    confirmed, possible, letters = constraints
+    index = word_index()
+    bits = index.all_words
+    for j in range(5):
+        c = ord(g[j]) - ord('a')
+        if e[j] == 'O':
+            bits &= index.position_bits[j][c]
+        elif e[j] == 'X' and g[j] not in confirmed:
+            bits &= yellow_bits(g[j], possible[g[j]], confirmed)
+        elif e[j] == '-' and letters[c] < 5:
+            bits &= ~index.min_count_bits[c][letters[c] + 1]
+    return bits
+
+
+# A green drops the yellow entry of its letter and can overwrite another
+# green, the only ways a guess makes the filter less strict
+def loosens_constraints(constraints, g, e):
+    confirmed, possible, _ = constraints
+    for j in range(5):
+        if e[j] == 'O' and (confirmed[j] not in ('', g[j]) or g[j] in possible):
+            return True
+    return False
+
+
+# Surviving candidates per game, keyed by a hash of the history so far. A
+# request that adds one guess to a cached history only filters the previous
+# survivors by that guess instead of replaying the whole game.
+game_cache = LRUCache(
+    "wordle-games",
+    maxsize=int(os.environ.get("WORDLE_GAME_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("WORDLE_GAME_CACHE_TTL", 600)),
+)
+
+
+def game_candidates(guess_history, evaluation_history):
+    n = min(len(guess_history), len(evaluation_history))
+    guess_history, evaluation_history = guess_history[:n], evaluation_history[:n]
+    key = payload_key([guess_history, evaluation_history])
+    cached = game_cache.get(key)
+    if cached is not None:
+        return cached[1]
+
+    previous = game_cache.get(payload_key([guess_history[:-1], evaluation_history[:-1]])) if n else None
+    if previous is None or loosens_constraints(previous[0], guess_history[-1], evaluation_history[-1]):
+        constraints = parse_constraints(guess_history, evaluation_history)
+        bits = candidate_bits(*constraints)
+    else:
+        constraints = apply_evaluation(previous[0], guess_history[-1], evaluation_history[-1])
+        bits = previous[1] & evaluation_bits(constraints, guess_history[-1], evaluation_history[-1])
+    game_cache.put(key, (constraints, bits))
+    return bits
+
+
+def first_word(bits):
+    words = word_index().words
+    if not bits:
+        return words[0]
+    return words[(bits & -bits).bit_length() - 1]
 
 
 def filter_words(guess_history, evaluation_history):
-    confirmed = [''] * 5
-    possible = {}
-    letters = [5] * 26
-    n = len(guess_history)
-    for i in range(n):
-        g = guess_history[i]
-        e = evaluation_history[i]
-        for j in range(5):
-            if e[j] == 'O':
-                confirmed[j] = g[j]
-            elif e[j] == 'X':
-                if possible.get(g[j]) == None:
-                    possible[g[j]] = [i for i in range(5) if i != j]
-                else:
-                    if j in possible[g[j]]:
-                        possible[g[j]].remove(j)  
-            elif e[j] == '-':
-                if g[j] not in confirmed and g[j] not in possible:    
-                    letters[ord(g[j]) - ord('a')] = 0
-           
-
-    res = ''
-    print(confirmed)
-    print(possible)
-    print(letters)
-    for word in WORD_LIST:
-        match = True
-        avail_index = [0, 1, 2, 3, 4]
-        
-        # Check against confirmed letters
-        for i in range(5):
-            if confirmed[i] != '':
-                if word[i] != confirmed[i]:
-                    match = False
-                    break  # Word does not match confirmed letter
-                else:
-                    avail_index.remove(i)
-                    if word[i] in possible:
-                        del possible[word[i]]
-        
-        if not match:
-            continue  # Skip this word if it doesn't match confirmed letters
-        # Check against possible letters and their positions
-        possible_duplicate = possible.copy()
-        for i in avail_index:
-            for k in possible:
-                if word[i] == k:
-                    if possible[k] != None and i in possible[k]:
-                        if k in possible_duplicate:
-                            del possible_duplicate[k]
-                    
-        if possible_duplicate:
+    return first_word(candidate_bits(*parse_constraints(guess_history, evaluation_history)))
+
+
+# Entropy strategy. FEEDBACK[g, a] is the feedback pattern for guessing
+# words[g] when the answer is words[a], as base-3 digits per position
+# ('-' = 0, 'X' = 1, 'O' = 2). The matrix is built once in a background
+# thread, saved to WORDLE_FEEDBACK_CACHE next to words.txt (or to
+# private_cache_dir() on a read-only tree) and memory-mapped from there
+# afterwards. Until it is ready, entropy requests fall back to the first
+# remaining candidate.
+FEEDBACK_CACHE_PATH = os.environ.get("WORDLE_FEEDBACK_CACHE", os.path.join(os.path.dirname(WORDS_PATH), 'wordle_feedback.npy'))
+FEEDBACK_PATTERNS = 3 ** 5
+MAX_SCORED_CELLS = 20_000_000  # Cap on guess x candidate feedback lookups per move
+SCORE_CHUNK_CELLS = 1 << 20  # Guess x candidate cells scored at once, bounding per-move memory
+_feedback = None
+_feedback_build = None
+_feedback_lock = threading.Lock()
+
+
+def feedback_patterns(guesses, answers):
+    green = guesses[:, None, :] == answers[None, :, :]
+    letter_counts = np.zeros((len(answers), 26), dtype=np.uint8)
+    for i in ALL_POSITIONS:
+        letter_counts[np.arange(len(answers)), answers[:, i] - ord('a')] += 1
+
+    patterns = np.zeros(green.shape[:2], dtype=np.uint8)
+    for i in ALL_POSITIONS:
+        same_letter = guesses == guesses[:, i, None]
+        # A non-green letter is yellow while the answer still has copies of it
+        # that are neither green nor claimed by an earlier yellow
+        available = letter_counts[:, guesses[:, i] - ord('a')].T.copy()
+        earlier = np.zeros_like(available)
+        for j in ALL_POSITIONS:
+            available -= same_letter[:, j, None] & green[:, :, j]
+            if j < i:
+                earlier += same_letter[:, j, None] & ~green[:, :, j]
+        yellow = ~green[:, :, i] & (earlier < available)
+        patterns += (2 * green[:, :, i] + yellow).astype(np.uint8) * 3 ** i
+    return patterns
+
+
+def build_feedback_matrix(codes, path, chunk=128):
+    tmp_path = "{}.{}.{}.tmp.npy".format(path, os.getpid(), threading.get_ident())
+    matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(len(codes), len(codes)))
+    for start in range(0, len(codes), chunk):
+        matrix[start:start + chunk] = feedback_patterns(codes[start:start + chunk], codes)
+    matrix.flush()
+    del matrix
+    os.replace(tmp_path, path)
+
+
+def feedback_cache_paths():
+    return FEEDBACK_CACHE_PATH, os.path.join(private_cache_dir(), os.path.basename(FEEDBACK_CACHE_PATH))
+
+
+# The first cached matrix that is newer than words.txt and has one row and
+# column per word, or None when every copy is missing or stale
+def current_feedback_path():
+    size = len(word_index().words)
+    for path in feedback_cache_paths():
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(WORDS_PATH):
             continue
-        
-        # Check against excluded letters
-        for j in range(26):
-            if word.count(chr(j + ord('a'))) > letters[j]:
-                match = False
-                break  # Word contains an excluded letter
-        # If all conditions are satisfied, add to valid guesses
-        if match:
-            res = word
-            break
-    if res == '':
-        return WORD_LIST[0]
-    return res
+        try:
+            if np.load(path, mmap_mode='r').shape == (size, size):
+                return path
+        except (OSError, ValueError):
+            pass
+    return None
+
+
+def load_feedback_matrix():
+    path = current_feedback_path()
+    if path is not None:
+        return np.load(path, mmap_mode='r')
+
+    words = word_index().words
+    for path in feedback_cache_paths():
+        logging.info("Building Wordle feedback matrix at {}".format(path))
+        try:
+            build_feedback_matrix(words.codes, path)
+            return np.load(path, mmap_mode='r')
+        except OSError as e:
+            logging.warning("Could not write Wordle feedback matrix {}: {}".format(path, e))
+    raise OSError("No writable location for the Wordle feedback matrix")
+
+
+def _build_feedback():
+    global _feedback, _feedback_build
+    try:
+        matrix = load_feedback_matrix()
+    except (OSError, ValueError) as e:
+        logging.warning("Wordle feedback matrix unavailable: {}".format(e))
+        with _feedback_lock:
+            _feedback_build = None  # Let a later request try again
+        return
+    with _feedback_lock:
+        _feedback = matrix
+
+
+# The feedback matrix if it is ready, otherwise None. The first call loads it
+# in a background thread and only waits when a current file already exists
+# and just has to be memory-mapped, so no request ever waits for a build.
+def feedback_matrix():
+    global _feedback_build
+    with _feedback_lock:
+        if _feedback is not None or _feedback_build is not None:
+            return _feedback
+        build = _feedback_build = threading.Thread(target=_build_feedback, name="wordle-feedback", daemon=True)
+        build.start()
+    if current_feedback_path() is not None:
+        build.join()
+    return _feedback
+
+
+def bit_indices(bits):
+    packed = np.frombuffer(bits.to_bytes((len(word_index().words) + 7) // 8, 'little'), dtype=np.uint8)
+    return np.nonzero(np.unpackbits(packed, bitorder='little'))[0]
+
+
+# Pick the guess whose feedback splits the candidates with the most expected
+# information, preferring guesses that could themselves be the answer
+def entropy_guess(bits):
+    candidates = bit_indices(bits)
+    if len(candidates) <= 2:
+        return first_word(bits)
+
+    matrix = feedback_matrix()
+    if matrix is None:
+        return first_word(bits)
+
+    words = word_index().words
+    guesses = np.arange(len(words))
+    if len(guesses) * len(candidates) > MAX_SCORED_CELLS:
+        guesses = candidates[:MAX_SCORED_CELLS // len(candidates)]
+    # Score the guesses in chunks, gathering only their uint8 guess x
+    # candidate cells; int32 histogram offsets fit 14855 * 243 comfortably
+    entropy = np.empty(len(guesses))
+    step = max(1, SCORE_CHUNK_CELLS // len(candidates))
+    for start in range(0, len(guesses), step):
+        patterns = matrix[np.ix_(guesses[start:start + step], candidates)]
+        rows = np.arange(len(patterns), dtype=np.int32)[:, None] * FEEDBACK_PATTERNS
+        histogram = np.bincount((patterns + rows).ravel(), minlength=len(patterns) * FEEDBACK_PATTERNS)
+        p = histogram.reshape(len(patterns), FEEDBACK_PATTERNS) / len(candidates)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entropy[start:start + step] = -np.where(p > 0, p * np.log2(p), 0).sum(axis=1)
+    entropy += np.isin(guesses, candidates) * 1e-9
+    return words[guesses[entropy.argmax()]]
+
 
 @app.route('/wordle-game', methods=['POST'])
 def wordle_game():
@@ -96,8 +408,13 @@ def wordle_game():
     if not guess_history:
         return jsonify({"guess": "slate"})
 
-    # Filter possible words based on the history
-    res = filter_words(guess_history, evaluation_history)
+    # Filter possible words based on the history; ?strategy=entropy picks the
+    # most informative guess instead of the first remaining candidate
+    bits = game_candidates(guess_history, evaluation_history)
+    if request.args.get("strategy") == "entropy":
+        res = entropy_guess(bits)
+    else:
+        res = first_word(bits)
     logging.info("My result :{}".format(res))
 
     return jsonify({"guess": res})